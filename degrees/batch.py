@@ -0,0 +1,214 @@
+import argparse
+import json
+import multiprocessing
+import sys
+
+import degrees
+from cache import MISSING, PathCache
+from snapshot import fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer many degrees queries without prompting. "
+                    "Reads one tab-separated source/target pair per line, "
+                    "given as person ids or unambiguous names, and writes "
+                    "one JSON object per pair."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("pairs", nargs="?", default="-",
+                        help="file of pairs, or - for stdin (default)")
+    parser.add_argument("--compact", action="store_true",
+                        help="load the data as a compact StarGraph")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="load the data from a binary snapshot")
+    parser.add_argument("--policy",
+                        choices=["most-films", "earliest-birth", "latest-birth"],
+                        help="resolve ambiguous names with this policy "
+                             "instead of rejecting them")
+    parser.add_argument("--fuzzy", type=int, default=0, metavar="EDITS",
+                        help="with --policy, accept the closest name within "
+                             "EDITS edits when there is no exact match")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes (default 1)")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="keep computed paths in an LRU cache saved to FILE")
+    parser.add_argument("--cache-size", type=int, default=100000,
+                        help="maximum number of cached paths (default 100000)")
+    args = parser.parse_args()
+
+    load_args = (args.directory, args.compact, args.snapshot)
+    # Stamp the dataset before loading it, so that a change made while
+    # it loads is caught by validate below
+    stamp = fingerprint(args.directory) if args.cache else None
+    degrees.load_data(*load_args, index_names=args.policy is not None)
+    cache = None
+    if args.cache:
+        cache = PathCache(args.cache_size, args.cache, stamp)
+
+    if args.pairs == "-":
+        queries = read_queries(sys.stdin, args.policy, args.fuzzy)
+    else:
+        with open(args.pairs, encoding="utf-8") as f:
+            queries = read_queries(f, args.policy, args.fuzzy)
+
+    for result in run_queries(queries, args.workers, load_args, cache):
+        print(json.dumps(result), flush=True)
+
+    if cache is not None:
+        # Workers load the dataset themselves, so paths may come from
+        # files changed since the stamp: drop them rather than save them
+        cache.validate(fingerprint(args.directory))
+        cache.save()
+        print(f"cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+
+
+def read_queries(lines, policy=None, max_distance=0):
+    """
+    Parses tab-separated (source, target) lines into a list of query
+    dicts carrying their line number, raw fields and resolved person_ids.
+
+    Blank lines are skipped. See `resolve` for how fields are resolved.
+    """
+    queries = []
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        fields = line.split("\t")
+        query = {"line": number, "fields": fields}
+        if len(fields) == 2:
+            query["source"] = resolve(fields[0], policy, max_distance)
+            query["target"] = resolve(fields[1], policy, max_distance)
+        queries.append(query)
+    return queries
+
+
+def resolve(field, policy=None, max_distance=0):
+    """
+    Returns the person_id given by `field`, either directly or as the
+    name of exactly one person, or None.
+
+    With a `policy`, names are instead resolved by
+    degrees.person_id_for_name without prompting.
+    """
+    field = field.strip()
+    if field in degrees.people:
+        return field
+    if policy is not None:
+        return degrees.person_id_for_name(field, policy, max_distance)
+    person_ids = degrees.names.get(field.lower(), set())
+    if len(person_ids) == 1:
+        return next(iter(person_ids))
+    return None
+
+
+def group_by_source(queries):
+    """
+    Returns a dict mapping each source person_id to the list of
+    queries starting from it, in input order.
+    """
+    groups = {}
+    for query in queries:
+        groups.setdefault(query["source"], []).append(query)
+    return groups
+
+
+def run_queries(queries, workers=1, load_args=None, cache=None):
+    """
+    Yields one result dict per query. Queries that cannot be resolved
+    come first, then queries answered by the PathCache `cache`, if any,
+    then each group of queries sharing a source, answered from a single
+    BFS tree per source.
+
+    With more than one worker, groups are answered in a process pool
+    and yielded as they complete. See `worker_pool` for how the workers
+    get the data.
+    """
+    pending = []
+    for query in queries:
+        if len(query["fields"]) != 2:
+            yield error(query, "expected a source and a target separated by a tab")
+        elif query["source"] is None:
+            yield error(query, f"person not found: {query['fields'][0]}")
+        elif query["target"] is None:
+            yield error(query, f"person not found: {query['fields'][1]}")
+        elif cache is None:
+            pending.append(query)
+        else:
+            path = cache.get(query["source"], query["target"])
+            if path is MISSING:
+                pending.append(query)
+            else:
+                yield result(query, path)
+
+    groups = group_by_source(pending).items()
+    if workers <= 1:
+        answered = map(answer_group, groups)
+    else:
+        pool = worker_pool(workers, load_args)
+        answered = pool.imap_unordered(answer_group, groups, chunksize=16)
+
+    try:
+        for results in answered:
+            for answer in results:
+                if cache is not None:
+                    cache.put(answer["source"], answer["target"], answer["path"])
+                yield answer
+    finally:
+        if workers > 1:
+            pool.terminate()
+
+
+def worker_pool(workers, load_args):
+    """
+    Returns a process pool of `workers` processes that can answer groups.
+
+    Where fork is available, workers inherit the data already loaded in
+    this process copy-on-write, so nothing is pickled or reloaded; in
+    compact mode the bulk of it sits in a few CSR arrays (or a shared
+    memory-mapped snapshot), so the shared pages stay mostly untouched.
+    Elsewhere each worker reloads the data with `load_args`, which is
+    cheapest from a snapshot.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork").Pool(workers)
+    if load_args is None:
+        raise ValueError("load_args are required without fork")
+    return multiprocessing.get_context("spawn").Pool(
+        workers, initializer=degrees.load_data, initargs=load_args
+    )
+
+
+def answer_group(group):
+    """
+    Returns the results for a (source, queries) pair of queries that
+    share the same source.
+    """
+    source, group = group
+    paths = degrees.shortest_paths(source, [query["target"] for query in group])
+    return [result(query, paths[query["target"]]) for query in group]
+
+
+def result(query, path):
+    """
+    Returns the JSON-ready result of `query` given its shortest path.
+    """
+    return {
+        "line": query["line"],
+        "source": query["source"],
+        "target": query["target"],
+        "degrees": None if path is None else len(path),
+        "path": path,
+    }
+
+
+def error(query, message):
+    """
+    Returns the JSON-ready result of a query that could not be run.
+    """
+    return {"line": query["line"], "error": message}
+
+
+if __name__ == "__main__":
+    main()
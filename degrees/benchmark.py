@@ -0,0 +1,365 @@
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+import batch
+import degrees
+import landmarks
+from graph import UNREACHABLE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for degrees.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser(
+        "search", help="compare search strategies for degrees.shortest_path"
+    )
+    search.set_defaults(run=benchmark_search)
+
+    parallel = commands.add_parser(
+        "parallel", help="measure batch query throughput per worker count"
+    )
+    parallel.add_argument("-j", "--workers", type=int, nargs="+",
+                          default=[1, 2, 4, 8])
+    parallel.add_argument("--snapshot", action="store_true",
+                          help="load the data from a binary snapshot")
+    parallel.set_defaults(run=benchmark_parallel)
+
+    loaders = commands.add_parser(
+        "load", help="compare memory and time of the data loaders"
+    )
+    loaders.set_defaults(run=benchmark_load)
+
+    suite = commands.add_parser(
+        "suite", help="run every strategy over random connected pairs and "
+                      "write latency, expansion and memory figures as JSON"
+    )
+    suite.add_argument("-k", "--landmarks", type=int, default=16,
+                       help="number of landmarks for the landmark strategy")
+    suite.add_argument("-o", "--output", default="-",
+                       help="file to write the JSON report to (default stdout)")
+    suite.set_defaults(run=benchmark_suite)
+
+    for command in (search, parallel, loaders, suite):
+        command.add_argument("directory", nargs="?", default="large")
+        command.add_argument("-n", "--pairs", type=int, default=100,
+                             help="number of random (source, target) pairs")
+        command.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+def benchmark_search(args):
+    """
+    Compares expanded people and wall time of every search strategy,
+    and the memory held by the dict and compact loaders.
+    """
+    print("Loading data...")
+    memory = {"dict": fresh_load(args.directory, compact=False)["bytes"]}
+    load(args.directory, compact=False, trace=False)
+    print("Data loaded.")
+
+    pairs = sample_pairs(args.pairs, args.seed)
+    strategies = {
+        "bfs": degrees.shortest_path,
+        "bidirectional": degrees.bidirectional_shortest_path,
+    }
+    results = {name: run(search, pairs) for name, search in strategies.items()}
+
+    # Reload as a StarGraph, which shortest_path then walks directly
+    memory["compact"] = fresh_load(args.directory, compact=True)["bytes"]
+    load(args.directory, compact=True, trace=False)
+    results["csr"] = run(degrees.shortest_path, pairs)
+
+    # Every strategy is exact, so they must agree on every distance
+    baseline = results["bfs"]["lengths"]
+    for name, result in results.items():
+        if result["lengths"] != baseline:
+            sys.exit(f"{name} disagrees with bfs on path lengths")
+
+    print(f"{len(pairs)} pairs, seed {args.seed}")
+    print(f"{'strategy':<15}{'expanded':>12}{'seconds':>12}")
+    for name, result in results.items():
+        print(f"{name:<15}{result['expanded']:>12}{result['seconds']:>12.4f}")
+    print(f"{'loader':<15}{'MiB':>12}")
+    for name, size in memory.items():
+        print(f"{name:<15}{size / 2 ** 20:>12.1f}")
+
+
+def benchmark_parallel(args):
+    """
+    Measures the queries per second of batch.run_queries on the compact
+    graph for each worker count. Every pair has its own source, so each
+    query costs one full BFS tree.
+    """
+    print("Loading data...")
+    degrees.load_data(args.directory, compact=True, snapshot=args.snapshot)
+    print("Data loaded.")
+
+    pairs = sample_pairs(args.pairs, args.seed)
+    queries = [
+        {"line": i, "fields": [source, target], "source": source, "target": target}
+        for i, (source, target) in enumerate(pairs, 1)
+    ]
+
+    print(f"{len(pairs)} pairs, seed {args.seed}")
+    print(f"{'workers':<15}{'queries/sec':>12}{'speedup':>12}")
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        results = list(batch.run_queries(queries, workers))
+        rate = len(results) / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{workers:<15}{rate:>12.1f}{rate / baseline:>12.2f}")
+
+
+def benchmark_load(args):
+    """
+    Compares the memory held after loading, the peak memory while
+    loading and the load time of each combination of loader options,
+    each measured in a fresh interpreter (see `fresh_load`).
+    """
+    print(f"{'loader':<15}{'MiB':>12}{'peak MiB':>12}{'seconds':>12}")
+    for compact in (False, True):
+        for lazy in (False, True):
+            name = ("compact" if compact else "dict") + ("-lazy" if lazy else "")
+            measured = fresh_load(args.directory, compact, lazy)
+            print(f"{name:<15}{measured['bytes'] / 2 ** 20:>12.1f}"
+                  f"{measured['peak_bytes'] / 2 ** 20:>12.1f}{measured['seconds']:>12.3f}")
+
+
+def fresh_load(directory, compact, lazy=False):
+    """
+    Returns the load time, held bytes and peak bytes allocated while
+    loading `directory`, like `measure_load`, but measured in new
+    processes, one for the timing and one under tracemalloc.
+
+    Loading earlier data in the same process would skew the figures:
+    strings it interned stay alive and the name index is kept, so later
+    loaders would look cheaper or dearer depending on the order.
+    """
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        seconds, _, _ = pool.apply(_load_once, (directory, compact, lazy, False))
+        _, size, peak = pool.apply(_load_once, (directory, compact, lazy, True))
+    return {"seconds": seconds, "bytes": size, "peak_bytes": peak}
+
+
+def _load_once(directory, compact, lazy, trace):
+    """
+    Loads `directory` and returns (seconds, bytes held, peak bytes), the
+    last two None without `trace`.
+    """
+    start = time.perf_counter()
+    size, peak = load(directory, compact, lazy, trace)
+    return time.perf_counter() - start, size, peak
+
+
+def load(directory, compact, lazy=False, trace=True):
+    """
+    Loads `directory` into the degrees globals and returns the number of
+    bytes the loaded data holds and the peak number of bytes allocated
+    while loading, or None for both without `trace`.
+    """
+    degrees.names.clear()
+    degrees.people.clear()
+    degrees.movies.clear()
+    degrees.graph = None
+    degrees.name_index = None
+    if not trace:
+        degrees.load_data(directory, compact, lazy=lazy)
+        return None, None
+    tracemalloc.start()
+    degrees.load_data(directory, compact, lazy=lazy)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+def benchmark_suite(args):
+    """
+    Samples connected pairs and measures every search strategy on them,
+    writing a JSON report with per-strategy latency percentiles (ms),
+    expanded people, peak traced memory while searching and whether its
+    degrees ever disagreed with plain BFS, plus the load cost of each
+    representation and the distribution of path lengths.
+    """
+    report = {"directory": args.directory, "pairs": args.pairs, "seed": args.seed,
+              "load": {}, "strategies": {}}
+
+    report["load"]["compact"] = measure_load(args.directory, compact=True)
+    pairs, lengths = sample_connected_pairs(args.pairs, args.seed)
+    report["path_lengths"] = {
+        str(length): count for length, count in sorted(Counter(lengths).items())
+    }
+
+    start = time.perf_counter()
+    index = landmarks.build_index(degrees.graph, args.landmarks)
+    report["load"]["landmarks"] = {"seconds": time.perf_counter() - start}
+
+    # Searches on the compact StarGraph
+    strategies = {
+        "csr": path_length(degrees.shortest_path),
+        "csr-bidirectional": path_length(degrees.bidirectional_shortest_path),
+        "landmarks": index.degrees,
+    }
+    for name, search in strategies.items():
+        report["strategies"][name] = measure(search, pairs, lengths)
+
+    # Searches on the dict of sets representation
+    report["load"]["dict"] = measure_load(args.directory, compact=False)
+    strategies = {
+        "bfs": path_length(degrees.shortest_path),
+        "bidirectional": path_length(degrees.bidirectional_shortest_path),
+    }
+    for name, search in strategies.items():
+        report["strategies"][name] = measure(search, pairs, lengths)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+def measure_load(directory, compact):
+    """
+    Loads `directory` and returns its load time, held bytes and peak
+    bytes allocated while loading, measured in fresh processes by
+    `fresh_load` before the data is loaded here for searching.
+    """
+    measured = fresh_load(directory, compact)
+    load(directory, compact, trace=False)
+    return measured
+
+
+def sample_connected_pairs(n, seed):
+    """
+    Returns `n` random (source, target) pairs of distinct connected
+    person_ids from the compact graph, and the degrees of each pair.
+
+    Each source is drawn uniformly among people with co-stars and its
+    target uniformly among the people it is connected to.
+    """
+    rng = random.Random(seed)
+    graph = degrees.graph
+    candidates = [
+        person for person in range(len(graph.person_ids))
+        if graph.person_offsets[person + 1] > graph.person_offsets[person]
+    ]
+    pairs = []
+    lengths = []
+    while len(pairs) < n:
+        if not candidates:
+            sys.exit("No connected pairs to sample.")
+        source = rng.choice(candidates)
+        distance = graph.distances(source)
+        reachable = [
+            person for person, d in enumerate(distance)
+            if d != UNREACHABLE and person != source
+        ]
+        if not reachable:
+            candidates.remove(source)
+            continue
+        target = rng.choice(reachable)
+        pairs.append((graph.person_ids[source], graph.person_ids[target]))
+        lengths.append(distance[target])
+    return pairs, lengths
+
+
+def path_length(search):
+    """
+    Wraps a path search into one returning the degrees of separation.
+    """
+    def degrees_of_separation(source, target, stats=None):
+        path = search(source, target, stats=stats)
+        return None if path is None else len(path)
+    return degrees_of_separation
+
+
+def measure(search, pairs, lengths):
+    """
+    Runs `search` over every pair and returns its latency percentiles,
+    expanded people, peak traced memory and number of answers that
+    differ from `lengths`.
+
+    Latencies are taken in an untraced pass, then the pairs are run
+    again under tracemalloc for the memory figure.
+    """
+    stats = {"expanded": 0}
+    latencies = []
+    disagreements = 0
+    for (source, target), length in zip(pairs, lengths):
+        start = time.perf_counter()
+        answer = search(source, target, stats)
+        latencies.append((time.perf_counter() - start) * 1000)
+        disagreements += answer != length
+
+    tracemalloc.start()
+    for source, target in pairs:
+        search(source, target, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1],
+        },
+        "expanded": {
+            "total": stats["expanded"],
+            "mean": stats["expanded"] / len(pairs),
+        },
+        "peak_bytes": peak,
+        "disagreements": disagreements,
+    }
+
+
+def percentile(values, p):
+    """
+    Returns the nearest-rank `p`th percentile of sorted `values`.
+    """
+    rank = max(1, -(-len(values) * p // 100))
+    return values[rank - 1]
+
+
+def sample_pairs(n, seed):
+    """
+    Returns `n` random (source, target) pairs of distinct person_ids.
+    """
+    rng = random.Random(seed)
+    person_ids = sorted(degrees.people)
+    if len(person_ids) < 2:
+        sys.exit("Need at least two people to sample pairs.")
+    return [tuple(rng.sample(person_ids, 2)) for _ in range(n)]
+
+
+def run(search, pairs):
+    """
+    Runs `search` over every pair and returns its total number of
+    expanded people, total wall time and the path length per pair.
+    """
+    stats = {"expanded": 0}
+    lengths = []
+    start = time.perf_counter()
+    for source, target in pairs:
+        path = search(source, target, stats=stats)
+        lengths.append(None if path is None else len(path))
+    seconds = time.perf_counter() - start
+    return {"expanded": stats["expanded"], "seconds": seconds, "lengths": lengths}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+import os
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class PathCache():
+    """
+    Bounded LRU cache of shortest paths keyed on the unordered pair of
+    people, so a path cached for (a, b) also answers (b, a).
+
+    `stamp` identifies the dataset the paths were computed on (see
+    snapshot.fingerprint). A cache file written for a different stamp
+    is ignored when loading, and `validate` drops every entry when the
+    dataset changes under a running cache, so that it is not saved.
+    """
+
+    def __init__(self, maxsize=100000, filename=None, stamp=None):
+        self.maxsize = maxsize
+        self.filename = filename
+        self.stamp = None if stamp is None else list(stamp)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if filename is not None:
+            self.load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, source, target, default=MISSING):
+        """
+        Returns the cached path from source to target, which may be None
+        for people that are not connected, or `default` on a miss.
+        """
+        key = (source, target) if source <= target else (target, source)
+        try:
+            path = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        if key[0] != source and path is not None:
+            path = reverse_path(target, path)
+        return path
+
+    def put(self, source, target, path):
+        """
+        Caches `path` from source to target, evicting the least recently
+        used entry when the cache is full.
+        """
+        if source <= target:
+            key = (source, target)
+        else:
+            key = (target, source)
+            if path is not None:
+                path = reverse_path(source, path)
+        self.entries[key] = path
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def validate(self, stamp):
+        """
+        Drops every entry if `stamp` differs from the cache's stamp.
+        """
+        stamp = list(stamp)
+        if stamp != self.stamp:
+            self.entries.clear()
+            self.stamp = stamp
+
+    def load(self):
+        """
+        Loads entries from the cache file, unless it is missing, was
+        written for another dataset or cannot be read back (a truncated
+        or corrupt file is ignored like a stale one).
+        """
+        try:
+            with open(self.filename, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            return
+        if not isinstance(data, dict) or data.get("stamp") != self.stamp:
+            return
+        try:
+            entries = [
+                (source, target, None if path is None else [tuple(step) for step in path])
+                for source, target, path in data["entries"]
+            ]
+        except (KeyError, TypeError, ValueError):
+            return
+        for source, target, path in entries:
+            self.put(source, target, path)
+
+    def save(self):
+        """
+        Writes every entry to the cache file, least recently used first.
+        """
+        data = {
+            "stamp": self.stamp,
+            "entries": [[*key, path] for key, path in self.entries.items()],
+        }
+        temporary = f"{self.filename}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temporary, self.filename)
+
+
+def reverse_path(source, path):
+    """
+    Returns `path` from `source` walked backwards, as a list of
+    (movie_id, person_id) pairs from its last person to `source`.
+    """
+    people = [source] + [person_id for _, person_id in path]
+    return [
+        (movie_id, people[i])
+        for i, (movie_id, _) in reversed(list(enumerate(path)))
+    ]
@@ -1,7 +1,11 @@
 import csv
 import sys
+from collections import deque
 
-from util import Node, StackFrontier, QueueFrontier
+from graph import build_graph
+from nameindex import NameIndex
+from snapshot import read_snapshot, write_snapshot
+from util import Node, DequeQueueFrontier
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,54 +16,190 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# Directory to read births, titles and years from on demand when they
+# were deferred by a lazy load_data, or None when they are all loaded
+metadata_directory = None
 
-def load_data(directory):
+# StarGraph holding the person/movie links when loaded in compact mode,
+# in which case `people` has no movies and `movies` has no stars
+graph = None
+
+# NameIndex over `people` for prefix, fuzzy and non-interactive lookups
+name_index = None
+
+
+def load_data(directory, compact=False, snapshot=False, index_names=False,
+              lazy=False):
     """
     Load data from CSV files into memory.
+
+    With `compact`, the links between people and movies are stored in
+    an integer-indexed StarGraph instead of per-record sets.
+
+    With `snapshot`, the data is loaded in compact mode from a binary
+    snapshot next to the CSV files, which is (re)built from the CSV
+    files whenever it is missing or out of date.
+
+    With `index_names`, a NameIndex is built once the data is loaded.
+
+    With `lazy`, births, titles and years are not kept when reading the
+    CSV files; see `load_metadata`. Snapshots always hold everything.
+
+    Rows are parsed positionally and ids are interned, so the ids in
+    the star sets share their strings with the keys of `people` and
+    `movies`.
     """
+    global graph, metadata_directory
+
+    if index_names:
+        load_data(directory, compact, snapshot, lazy=lazy)
+        build_name_index()
+        return
+
+    if snapshot:
+        data = read_snapshot(directory)
+        if data is None:
+            load_data(directory, compact=True)
+            try:
+                write_snapshot(directory, people, movies, graph)
+            except OSError:
+                # Read-only dataset: keep running without a snapshot
+                pass
+            return
+        metadata_directory = None
+        loaded_people, loaded_movies, graph = data
+        people.update(loaded_people)
+        movies.update(loaded_movies)
+        for person_id, person in people.items():
+            names.setdefault(person["name"].lower(), set()).add(person_id)
+        return
+
+    metadata_directory = directory if lazy else None
+
     # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    with open(f"{directory}/people.csv", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = _columns(next(reader), "id", "name", "birth")
         for row in reader:
-            people[row["id"]] = {
-                "name": row["name"],
-                "birth": row["birth"],
-                "movies": set()
-            }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
+            person_id, name, birth = (row[i] for i in columns)
+            person_id = sys.intern(person_id)
+            people[person_id] = {"name": name}
+            if not lazy:
+                people[person_id]["birth"] = sys.intern(birth)
+            if not compact:
+                people[person_id]["movies"] = set()
+            if name.lower() not in names:
+                names[name.lower()] = {person_id}
             else:
-                names[row["name"].lower()].add(row["id"])
+                names[name.lower()].add(person_id)
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    with open(f"{directory}/movies.csv", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = _columns(next(reader), "id", "title", "year")
         for row in reader:
-            movies[row["id"]] = {
-                "title": row["title"],
-                "year": row["year"],
-                "stars": set()
-            }
+            movie_id, title, year = (row[i] for i in columns)
+            movie_id = sys.intern(movie_id)
+            movies[movie_id] = {}
+            if not lazy:
+                movies[movie_id]["title"] = title
+                movies[movie_id]["year"] = sys.intern(year)
+            if not compact:
+                movies[movie_id]["stars"] = set()
 
     # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    with open(f"{directory}/stars.csv", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        columns = _columns(next(reader), "person_id", "movie_id")
+        if compact:
+            graph = build_graph(
+                list(people), list(movies),
+                ((row[columns[0]], row[columns[1]]) for row in reader)
+            )
+            return
+        graph = None
         for row in reader:
+            person_id, movie_id = (row[i] for i in columns)
             try:
-                people[row["person_id"]]["movies"].add(row["movie_id"])
-                movies[row["movie_id"]]["stars"].add(row["person_id"])
+                # Store the interned ids from people and movies rather
+                # than a fresh copy of each string per row
+                movie = movies[movie_id]
+                person = people[person_id]
             except KeyError:
-                pass
+                continue
+            person["movies"].add(sys.intern(movie_id))
+            movie["stars"].add(sys.intern(person_id))
+
+
+def _columns(header, *fields):
+    """
+    Returns the position of each of `fields` in a CSV header row.
+    """
+    return [header.index(field) for field in fields]
+
+
+def load_metadata(person_ids=(), movie_ids=()):
+    """
+    Loads the births of `person_ids` and the titles and years of
+    `movie_ids` that were deferred by a lazy load_data, with one pass
+    over each CSV file that has something missing.
+    """
+    if metadata_directory is None:
+        return
+    person_ids = {i for i in person_ids if "birth" not in people[i]}
+    movie_ids = {i for i in movie_ids if "title" not in movies[i]}
+
+    if person_ids:
+        with open(f"{metadata_directory}/people.csv", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            columns = _columns(next(reader), "id", "birth")
+            for row in reader:
+                person_id, birth = (row[i] for i in columns)
+                if person_id in person_ids:
+                    people[person_id]["birth"] = birth
+
+    if movie_ids:
+        with open(f"{metadata_directory}/movies.csv", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            columns = _columns(next(reader), "id", "title", "year")
+            for row in reader:
+                movie_id, title, year = (row[i] for i in columns)
+                if movie_id in movie_ids:
+                    movies[movie_id]["title"] = title
+                    movies[movie_id]["year"] = year
+
+
+def person_births(person_ids):
+    """
+    Returns the birth year of each of `person_ids`, loading any that
+    were deferred.
+    """
+    load_metadata(person_ids=person_ids)
+    return [people[person_id]["birth"] for person_id in person_ids]
+
+
+def movie_titles(movie_ids):
+    """
+    Returns the title of each of `movie_ids`, loading any that were
+    deferred.
+    """
+    load_metadata(movie_ids=movie_ids)
+    return [movies[movie_id]["title"] for movie_id in movie_ids]
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    args = sys.argv[1:]
+    flags = {flag for flag in ("--compact", "--snapshot", "--lazy") if flag in args}
+    for flag in flags:
+        args.remove(flag)
+    if len(args) > 1:
+        sys.exit("Usage: python degrees.py [--compact] [--snapshot] [--lazy] [directory]")
+    directory = args[0] if len(args) == 1 else "large"
     print(sys.argv)
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(directory, "--compact" in flags, "--snapshot" in flags,
+              lazy="--lazy" in flags)
     print("Data loaded.")
     while True:
         source = person_id_for_name(input("Name: "))
@@ -76,21 +216,25 @@ def main():
         else:
             degrees = len(path)
             print(f"{degrees} degrees of separation.")
+            titles = movie_titles([movie_id for movie_id, _ in path])
             path = [(None, source)] + path
             for i in range(degrees):
                 person1 = people[path[i][1]]["name"]
                 person2 = people[path[i + 1][1]]["name"]
-                movie = movies[path[i + 1][0]]["title"]
+                movie = titles[i]
                 print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, stats=None):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
     If no possible path, returns None.
 
+    If `stats` is a dict, the number of expanded people is
+    accumulated under its "expanded" key.
+
     Approach:
     -  Start with a frontier that contains a initial state
     -  Repeat:
@@ -98,13 +242,25 @@ def shortest_path(source, target):
         -  Remove the first node from frontier and add it to explored
         -  If node is goal, return the solution
         -  Expand node, add resulting nodes to the frontier
+
+    A person is 0 degrees from themselves, so source == target gives
+    an empty path, as in every other search here.
+
+    In compact mode the search walks the StarGraph arrays instead.
     """
-    frontier = QueueFrontier()  # BFS
+    if graph is not None:
+        return graph.shortest_path(source, target, stats)
+    if source == target:
+        return []
+
+    frontier = DequeQueueFrontier()  # BFS
     explored = set()
     frontier.add(Node(source, None, None))
     while not frontier.empty():
         node = frontier.remove()
         explored.add(node.state)
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
         for neighbor in neighbors_for_person(node.state):
             movie_id, person_id = neighbor
 
@@ -116,7 +272,7 @@ def shortest_path(source, target):
                 path.reverse()
                 return path
 
-            if person_id not in explored and not frontier.contains_state(node.state):
+            if person_id not in explored and not frontier.contains_state(person_id):
                 frontier.add(Node(person_id, node, neighbor))
 
     return None
@@ -144,20 +300,159 @@ def shortest_path(source, target):
     # return None
 
 
-def person_id_for_name(name):
+def bidirectional_shortest_path(source, target, stats=None):
+    """
+    Returns the shortest list of (movie_id, person_id) pairs
+    that connect the source to the target, like `shortest_path`,
+    but searches from both ends at once.
+
+    If no possible path, returns None.
+
+    Approach:
+    -  Keep one BFS layer per side, each with a parent map of the
+       people it has reached
+    -  Repeat:
+        -  If either layer is empty: No Solution
+        -  Expand the whole smaller layer by one step
+        -  If a newly reached person was already reached by the other
+           side, the two halves meet there: join them into a path
+    Because every layer is checked against everything the other side
+    has reached, the first meeting point is on a shortest path.
+    """
+    if source == target:
+        return []
+
+    # person_id -> (previous person_id, movie_id) towards each end
+    forward = {source: None}
+    backward = {target: None}
+    forward_layer = [source]
+    backward_layer = [target]
+
+    while forward_layer and backward_layer:
+        # Always grow the cheaper side
+        if len(forward_layer) <= len(backward_layer):
+            layer, reached, other = forward_layer, forward, backward
+        else:
+            layer, reached, other = backward_layer, backward, forward
+
+        next_layer = []
+        for state in layer:
+            if stats is not None:
+                stats["expanded"] = stats.get("expanded", 0) + 1
+            for movie_id, person_id in neighbors_for_person(state):
+                if person_id in reached:
+                    continue
+                reached[person_id] = (state, movie_id)
+                if person_id in other:
+                    return _join_paths(forward, backward, person_id)
+                next_layer.append(person_id)
+
+        if reached is forward:
+            forward_layer = next_layer
+        else:
+            backward_layer = next_layer
+
+    return None
+
+
+def _join_paths(forward, backward, meeting):
+    """
+    Builds the (movie_id, person_id) path through `meeting` from the
+    forward and backward parent maps of `bidirectional_shortest_path`.
+    """
+    path = []
+    person_id = meeting
+    while forward[person_id] is not None:
+        parent, movie_id = forward[person_id]
+        path.append((movie_id, person_id))
+        person_id = parent
+    path.reverse()
+
+    person_id = meeting
+    while backward[person_id] is not None:
+        child, movie_id = backward[person_id]
+        path.append((movie_id, child))
+        person_id = child
+    return path
+
+
+def shortest_paths(source, targets, stats=None):
+    """
+    Returns a dict mapping every person_id in `targets` to its shortest
+    list of (movie_id, person_id) pairs from the source, or None if it
+    is not connected.
+
+    All targets are answered from a single BFS tree rooted at the
+    source, which stops growing once every target has been reached.
+    """
+    if graph is not None:
+        return graph.shortest_paths(source, targets, stats)
+
+    paths = {target: None for target in targets}
+    remaining = set(paths)
+    if source in remaining:
+        paths[source] = []
+        remaining.discard(source)
+
+    # person_id -> (previous person_id, movie_id) towards the source
+    parents = {source: None}
+    frontier = deque([source])
+    while frontier and remaining:
+        state = frontier.popleft()
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + 1
+        for movie_id, person_id in neighbors_for_person(state):
+            if person_id in parents:
+                continue
+            parents[person_id] = (state, movie_id)
+            frontier.append(person_id)
+            if person_id in remaining:
+                paths[person_id] = _join_paths(parents, {person_id: None}, person_id)
+                remaining.discard(person_id)
+
+    return paths
+
+
+def build_name_index():
+    """
+    Builds the NameIndex over the loaded people.
+    """
+    global name_index
+    name_index = NameIndex(people, movie_count, person_births)
+
+
+def movie_count(person_id):
+    """
+    Returns the number of movies a person starred in.
+    """
+    if graph is not None:
+        person = graph.person_index[person_id]
+        return graph.person_offsets[person + 1] - graph.person_offsets[person]
+    return len(people[person_id]["movies"])
+
+
+def person_id_for_name(name, policy=None, max_distance=0):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
+
+    With a `policy` (see NameIndex), ambiguities are resolved without
+    prompting and a name with no exact match falls back to the closest
+    name within `max_distance` edits.
     """
+    if policy is not None:
+        if name_index is None:
+            build_name_index()
+        return name_index.resolve(name, policy, max_distance)
+
     person_ids = list(names.get(name.lower(), set()))
     if len(person_ids) == 0:
         return None
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
-        for person_id in person_ids:
-            person = people[person_id]
-            name = person["name"]
-            birth = person["birth"]
+        births = person_births(person_ids)
+        for person_id, birth in zip(person_ids, births):
+            name = people[person_id]["name"]
             print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
         try:
             person_id = input("Intended Person ID: ")
@@ -175,6 +470,9 @@ def neighbors_for_person(person_id):
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
+    if graph is not None:
+        return graph.neighbors(person_id)
+
     movie_ids = people[person_id]["movies"]
     neighbors = set()
     for movie_id in movie_ids:
@@ -0,0 +1,198 @@
+from array import array
+from collections import deque
+
+# Distance stored by StarGraph.distances for people out of reach
+UNREACHABLE = 255
+
+
+class StarGraph():
+    """
+    Bipartite graph of people and the movies they starred in, stored as
+    two CSR (compressed sparse row) adjacency structures over dense ints.
+
+    Person `p` starred in movies
+        person_movies[person_offsets[p]:person_offsets[p + 1]]
+    and movie `m` has stars
+        movie_stars[movie_offsets[m]:movie_offsets[m + 1]].
+
+    `person_ids` and `movie_ids` map the dense ints back to IMDB ids,
+    `person_index` and `movie_index` map IMDB ids to dense ints.
+    """
+
+    def __init__(self, person_ids, movie_ids,
+                 person_offsets, person_movies, movie_offsets, movie_stars):
+        self.person_ids = person_ids
+        self.movie_ids = movie_ids
+        self.person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+        self.movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+
+    def movies_for(self, person):
+        """
+        Returns the dense movie ints that dense person int `person` starred in.
+        """
+        return self.person_movies[self.person_offsets[person]:self.person_offsets[person + 1]]
+
+    def stars_for(self, movie):
+        """
+        Returns the dense person ints that starred in dense movie int `movie`.
+        """
+        return self.movie_stars[self.movie_offsets[movie]:self.movie_offsets[movie + 1]]
+
+    def neighbors(self, person_id):
+        """
+        Returns (movie_id, person_id) pairs for people who starred with
+        the person with IMDB id `person_id`.
+        """
+        person = self.person_index[person_id]
+        return {
+            (self.movie_ids[movie], self.person_ids[star])
+            for movie in self.movies_for(person)
+            for star in self.stars_for(movie)
+        }
+
+    def shortest_path(self, source, target, stats=None):
+        """
+        Returns the shortest list of (movie_id, person_id) pairs
+        that connect the source to the target, walking the CSR arrays.
+
+        If no possible path, returns None.
+        """
+        return self.shortest_paths(source, [target], stats)[target]
+
+    def shortest_paths(self, source, targets, stats=None):
+        """
+        Returns a dict mapping every person_id in `targets` to its
+        shortest (movie_id, person_id) path from the source, or None
+        if it is not connected, from a single BFS tree.
+
+        The search stops as soon as every target has been reached.
+        Every movie is scanned at most once, since all of its stars are
+        reached the first time any of them is expanded.
+        """
+        source_id = source
+        source = self.person_index[source]
+        paths = {target: None for target in targets}
+        remaining = {self.person_index[target] for target in paths}
+        if source in remaining:
+            paths[source_id] = []
+            remaining.discard(source)
+
+        # Dense person int -> the person and movie it was reached through
+        parent = {source: -1}
+        via = {}
+        movie_seen = bytearray(len(self.movie_ids))
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+
+        frontier = deque([source])
+        while frontier and remaining:
+            person = frontier.popleft()
+            if stats is not None:
+                stats["expanded"] = stats.get("expanded", 0) + 1
+            for movie in person_movies[person_offsets[person]:person_offsets[person + 1]]:
+                if movie_seen[movie]:
+                    continue
+                movie_seen[movie] = 1
+                for star in movie_stars[movie_offsets[movie]:movie_offsets[movie + 1]]:
+                    if star in parent:
+                        continue
+                    parent[star] = person
+                    via[star] = movie
+                    frontier.append(star)
+                    if star in remaining:
+                        paths[self.person_ids[star]] = self._path(parent, via, star)
+                        remaining.discard(star)
+                if not remaining:
+                    break
+
+        return paths
+
+    def distances(self, source):
+        """
+        Returns an array('B') holding the number of degrees between dense
+        person int `source` and every person, or UNREACHABLE for people
+        it is not connected to or that are UNREACHABLE or more apart.
+        """
+        distance = array("B", bytes([UNREACHABLE])) * len(self.person_ids)
+        distance[source] = 0
+        movie_seen = bytearray(len(self.movie_ids))
+        layer = [source]
+        depth = 0
+        while layer and depth + 1 < UNREACHABLE:
+            depth += 1
+            next_layer = []
+            for person in layer:
+                for movie in self.movies_for(person):
+                    if movie_seen[movie]:
+                        continue
+                    movie_seen[movie] = 1
+                    for star in self.stars_for(movie):
+                        if distance[star] == UNREACHABLE:
+                            distance[star] = depth
+                            next_layer.append(star)
+            layer = next_layer
+        return distance
+
+    def _path(self, parent, via, person):
+        """
+        Follows `parent` back from `person` and returns the path in
+        (movie_id, person_id) form.
+        """
+        path = []
+        while parent[person] != -1:
+            path.append((self.movie_ids[via[person]], self.person_ids[person]))
+            person = parent[person]
+        path.reverse()
+        return path
+
+
+def build_graph(person_ids, movie_ids, stars):
+    """
+    Builds a StarGraph from ordered lists of person and movie ids and
+    an iterable of (person_id, movie_id) star pairs.
+
+    Pairs naming an unknown person or movie are skipped.
+    """
+    person_index = {person_id: i for i, person_id in enumerate(person_ids)}
+    movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+
+    # Collect the edges as two parallel int arrays
+    edge_people = array("i")
+    edge_movies = array("i")
+    for person_id, movie_id in stars:
+        person = person_index.get(person_id)
+        movie = movie_index.get(movie_id)
+        if person is None or movie is None:
+            continue
+        edge_people.append(person)
+        edge_movies.append(movie)
+
+    person_offsets, person_movies = _csr(len(person_ids), edge_people, edge_movies)
+    movie_offsets, movie_stars = _csr(len(movie_ids), edge_movies, edge_people)
+    return StarGraph(person_ids, movie_ids,
+                     person_offsets, person_movies, movie_offsets, movie_stars)
+
+
+def _csr(n, rows, columns):
+    """
+    Counting-sorts the (rows[i], columns[i]) edges into CSR offsets and
+    indices for `n` rows.
+    """
+    offsets = array("i", bytes(4 * (n + 1)))
+    for row in rows:
+        offsets[row + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+
+    indices = array("i", bytes(4 * len(columns)))
+    cursor = offsets[:-1]
+    for row, column in zip(rows, columns):
+        indices[cursor[row]] = column
+        cursor[row] += 1
+    return offsets, indices
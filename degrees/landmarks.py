@@ -0,0 +1,202 @@
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+
+import batch
+import degrees
+from graph import UNREACHABLE
+from snapshot import fingerprint
+
+FILENAME = "degrees.landmarks"
+
+MAGIC = b"DEGLMRK1"
+
+# magic, (mtime_ns, size) per source CSV, landmarks, people
+HEADER = struct.Struct("=8s6q2q")
+
+
+class LandmarkIndex():
+    """
+    Distances from K landmark people to everyone in a StarGraph.
+
+    By the triangle inequality, for every landmark L
+        |d(L, s) - d(L, t)| <= d(s, t) <= d(L, s) + d(L, t)
+    so a handful of array lookups bound the degrees between any two
+    people without searching the graph.
+    """
+
+    def __init__(self, graph, landmarks, distances, stamp=None):
+        self.graph = graph
+        self.landmarks = landmarks
+        self.distances = distances
+        self.stamp = stamp
+
+    def bounds(self, source, target):
+        """
+        Returns (lower, upper) bounds on the degrees of separation between
+        person_ids source and target. Both are math.inf when a landmark
+        shows they are not connected; upper is math.inf when no landmark
+        reaches both of them.
+        """
+        if source == target:
+            return 0, 0
+        source = self.graph.person_index[source]
+        target = self.graph.person_index[target]
+        lower, upper = 0, math.inf
+        for distance in self.distances:
+            to_source = distance[source]
+            to_target = distance[target]
+            if to_source == UNREACHABLE and to_target == UNREACHABLE:
+                continue
+            if to_source == UNREACHABLE or to_target == UNREACHABLE:
+                return math.inf, math.inf
+            lower = max(lower, abs(to_source - to_target))
+            upper = min(upper, to_source + to_target)
+        # Distinct people are always at least one degree apart
+        return max(lower, 1), upper
+
+    def degrees(self, source, target, stats=None):
+        """
+        Returns the exact degrees of separation between source and target,
+        or None if they are not connected.
+
+        The bounds answer the query when they agree; only otherwise is
+        the graph searched, which is counted under the "searches" key of
+        `stats` if it is a dict, along with the people it expands.
+        """
+        lower, upper = self.bounds(source, target)
+        if lower == upper:
+            return None if lower == math.inf else lower
+        if stats is not None:
+            stats["searches"] = stats.get("searches", 0) + 1
+        path = self.graph.shortest_path(source, target, stats)
+        return None if path is None else len(path)
+
+    def save(self, filename):
+        """
+        Writes the landmarks and their distance arrays to `filename`.
+        """
+        header = HEADER.pack(
+            MAGIC, *(self.stamp or (0,) * 6),
+            len(self.landmarks), len(self.graph.person_ids)
+        )
+        temporary = f"{filename}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(header)
+            f.write(array("i", self.landmarks).tobytes())
+            for distance in self.distances:
+                f.write(bytes(distance))
+        os.replace(temporary, filename)
+
+
+def load_index(graph, filename, stamp=None):
+    """
+    Returns the LandmarkIndex for `graph` saved in `filename`, or None if
+    there is no such file or it was built for another dataset.
+    """
+    try:
+        with open(filename, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    fields = HEADER.unpack_from(data)
+    magic, saved_stamp, k, n = fields[0], fields[1:7], fields[7], fields[8]
+    if magic != MAGIC or n != len(graph.person_ids):
+        return None
+    if stamp is not None and saved_stamp != tuple(stamp):
+        return None
+
+    offset = HEADER.size
+    landmarks = array("i", data[offset:offset + 4 * k])
+    offset += 4 * k
+    distances = []
+    for _ in range(k):
+        distances.append(array("B", data[offset:offset + n]))
+        offset += n
+    return LandmarkIndex(graph, list(landmarks), distances, saved_stamp)
+
+
+def build_index(graph, k=16, stamp=None):
+    """
+    Returns a LandmarkIndex over `graph` with up to `k` landmarks.
+
+    Landmarks are the people with the most co-stars, skipping anyone
+    within one degree of a landmark already chosen so that they spread
+    over the graph instead of clustering around the same movies.
+    """
+    costars = array("i", bytes(4 * len(graph.person_ids)))
+    for person in range(len(graph.person_ids)):
+        costars[person] = sum(len(graph.stars_for(movie)) - 1
+                              for movie in graph.movies_for(person))
+    candidates = sorted(range(len(graph.person_ids)),
+                        key=costars.__getitem__, reverse=True)
+
+    landmarks = []
+    distances = []
+    for person in candidates:
+        if len(landmarks) == k:
+            break
+        if any(distance[person] <= 1 for distance in distances):
+            continue
+        landmarks.append(person)
+        distances.append(graph.distances(person))
+    return LandmarkIndex(graph, landmarks, distances, stamp)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estimate degrees of separation from a landmark index. "
+                    "Reads tab-separated source/target pairs like batch.py "
+                    "and writes the bounds and exact degrees as JSON lines."
+    )
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("pairs", nargs="?", default="-",
+                        help="file of pairs, or - for stdin (default)")
+    parser.add_argument("-k", "--landmarks", type=int, default=16,
+                        help="number of landmarks when building (default 16)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="rebuild the index even if it is up to date")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="load the data from a binary snapshot")
+    args = parser.parse_args()
+
+    degrees.load_data(args.directory, compact=True, snapshot=args.snapshot)
+    stamp = fingerprint(args.directory)
+    filename = os.path.join(args.directory, FILENAME)
+    index = None if args.rebuild else load_index(degrees.graph, filename, stamp)
+    if index is None:
+        print("Building landmark index...", file=sys.stderr)
+        index = build_index(degrees.graph, args.landmarks, stamp)
+        index.save(filename)
+
+    if args.pairs == "-":
+        queries = batch.read_queries(sys.stdin)
+    else:
+        with open(args.pairs, encoding="utf-8") as f:
+            queries = batch.read_queries(f)
+
+    stats = {"searches": 0}
+    for query in queries:
+        if query.get("source") is None or query.get("target") is None:
+            print(json.dumps(batch.error(query, "expected two known people")))
+            continue
+        lower, upper = index.bounds(query["source"], query["target"])
+        print(json.dumps({
+            "line": query["line"],
+            "source": query["source"],
+            "target": query["target"],
+            "lower": None if lower == math.inf else lower,
+            "upper": None if upper == math.inf else upper,
+            "degrees": index.degrees(query["source"], query["target"], stats),
+        }))
+    print(f"exact searches: {stats['searches']} of {len(queries)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
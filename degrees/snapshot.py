@@ -0,0 +1,128 @@
+import mmap
+import os
+import struct
+from array import array
+
+from graph import StarGraph
+
+FILENAME = "degrees.snapshot"
+SOURCES = ("people.csv", "movies.csv", "stars.csv")
+
+MAGIC = b"DEGSNAP1"
+
+# magic, (mtime_ns, size) per source CSV, people, movies, stars,
+# then the byte length of each of the six string tables
+HEADER = struct.Struct("=8s6q3q6q")
+
+
+def snapshot_path(directory):
+    """
+    Returns the path of the snapshot file for `directory`.
+    """
+    return os.path.join(directory, FILENAME)
+
+
+def fingerprint(directory):
+    """
+    Returns the (mtime_ns, size) of every source CSV in `directory`,
+    flattened into one tuple.
+    """
+    values = []
+    for name in SOURCES:
+        stat = os.stat(os.path.join(directory, name))
+        values.extend((stat.st_mtime_ns, stat.st_size))
+    return tuple(values)
+
+
+def write_snapshot(directory, people, movies, graph):
+    """
+    Writes `people`, `movies` and the StarGraph `graph` built from them
+    to the snapshot file for `directory`.
+
+    The file holds a fixed header, the four CSR arrays as native int32
+    and six NUL-separated UTF-8 string tables. It is written to a
+    temporary file first so readers never see a partial snapshot.
+    """
+    tables = [
+        "\0".join(graph.person_ids),
+        "\0".join(people[person_id]["name"] for person_id in graph.person_ids),
+        "\0".join(people[person_id]["birth"] for person_id in graph.person_ids),
+        "\0".join(graph.movie_ids),
+        "\0".join(movies[movie_id]["title"] for movie_id in graph.movie_ids),
+        "\0".join(movies[movie_id]["year"] for movie_id in graph.movie_ids),
+    ]
+    tables = [table.encode("utf-8") for table in tables]
+
+    header = HEADER.pack(
+        MAGIC, *fingerprint(directory),
+        len(graph.person_ids), len(graph.movie_ids), len(graph.person_movies),
+        *(len(table) for table in tables)
+    )
+
+    path = snapshot_path(directory)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(header)
+        for values in (graph.person_offsets, graph.person_movies,
+                       graph.movie_offsets, graph.movie_stars):
+            f.write(array("i", values).tobytes())
+        for table in tables:
+            f.write(table)
+    os.replace(temporary, path)
+
+
+def read_snapshot(directory):
+    """
+    Returns (people, movies, graph) loaded from the snapshot file for
+    `directory`, or None if there is no snapshot or the CSV files have
+    changed since it was written.
+
+    The CSR arrays of the returned graph are views straight into the
+    memory-mapped file.
+    """
+    path = snapshot_path(directory)
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return None
+
+    if len(buffer) < HEADER.size:
+        return None
+    fields = HEADER.unpack_from(buffer)
+    magic, stamp = fields[0], fields[1:7]
+    n_people, n_movies, n_stars = fields[7:10]
+    table_sizes = fields[10:]
+    if magic != MAGIC or stamp != fingerprint(directory):
+        return None
+
+    view = memoryview(buffer)
+    offset = HEADER.size
+    arrays = []
+    for length in (n_people + 1, n_stars, n_movies + 1, n_stars):
+        arrays.append(view[offset:offset + 4 * length].cast("i"))
+        offset += 4 * length
+
+    tables = []
+    counts = (n_people,) * 3 + (n_movies,) * 3
+    for size, count in zip(table_sizes, counts):
+        table = str(view[offset:offset + size], "utf-8")
+        tables.append(table.split("\0") if count else [])
+        offset += size
+    person_ids, person_names, births, movie_ids, titles, years = tables
+
+    people = {
+        person_id: {"name": name, "birth": birth}
+        for person_id, name, birth in zip(person_ids, person_names, births)
+    }
+    movies = {
+        movie_id: {"title": title, "year": year}
+        for movie_id, title, year in zip(movie_ids, titles, years)
+    }
+    graph = StarGraph(person_ids, movie_ids, *arrays)
+    return people, movies, graph
@@ -0,0 +1,150 @@
+import sys
+
+import numpy as np
+
+from heredity import PROBS, load_data, print_probabilities
+from inference import GENES, child_gene
+
+# Assignments evaluated per batch
+BATCH = 1 << 16
+
+# log P(gene count g) for people without parents, indexed by g
+LOG_GENE = np.log([PROBS["gene"][g] for g in range(3)])
+
+# log P(trait t | gene count g), indexed by [g, t]
+LOG_TRAIT = np.log([[PROBS["trait"][g][t] for t in (False, True)] for g in range(3)])
+
+# log P(child has c copies | mother has m, father has f), indexed by [m, f, c]
+LOG_INHERITANCE = np.log([
+    [[child_gene(m, f, c) for c in range(3)] for f in range(3)] for m in range(3)
+])
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python batched.py data.csv")
+    people = load_data(sys.argv[1])
+    print_probabilities(Pedigree(people).marginals())
+
+
+class Pedigree():
+    """
+    The people of a load_data dict compiled into index arrays, so that
+    the joint probability of a whole batch of assignments is a handful
+    of table lookups and row sums.
+
+    An assignment is a row of the (assignments x people) int8 matrix
+    `genes` of gene counts and of the bool matrix `traits`, with people
+    in the order of `names`. `founders` indexes the people without
+    parents; `children`, `mothers` and `fathers` the others and their
+    parents.
+    """
+
+    def __init__(self, people):
+        self.people = people
+        self.names = list(people)
+        index = {name: i for i, name in enumerate(self.names)}
+        self.founders = np.array(
+            [i for i, name in enumerate(self.names) if people[name]["mother"] is None],
+            dtype=np.int64
+        )
+        self.children = np.array(
+            [i for i, name in enumerate(self.names) if people[name]["mother"] is not None],
+            dtype=np.int64
+        )
+        self.mothers = np.array(
+            [index[people[self.names[i]]["mother"]] for i in self.children], dtype=np.int64
+        )
+        self.fathers = np.array(
+            [index[people[self.names[i]]["father"]] for i in self.children], dtype=np.int64
+        )
+        traits = [people[name]["trait"] for name in self.names]
+        self.known = np.array([trait is True for trait in traits])
+        self.unknown = np.array([trait is None for trait in traits])
+
+    def encode(self, assignments):
+        """
+        Return the (genes, traits) matrices of an iterable of
+        (one_gene, two_genes, have_trait) sets as taken by
+        joint_probability.
+        """
+        genes = []
+        traits = []
+        for one_gene, two_genes, have_trait in assignments:
+            genes.append([1 if name in one_gene else 2 if name in two_genes else 0
+                          for name in self.names])
+            traits.append([name in have_trait for name in self.names])
+        shape = (len(genes), len(self.names))
+        return (np.array(genes, dtype=np.int8).reshape(shape),
+                np.array(traits, dtype=bool).reshape(shape))
+
+    def log_joint_probability(self, genes, traits):
+        """
+        Return the natural log of joint_probability for every row of
+        `genes` and `traits`.
+        """
+        log_p = LOG_TRAIT[genes, traits.view(np.int8)].sum(axis=1)
+        log_p += LOG_GENE[genes[:, self.founders]].sum(axis=1)
+        log_p += LOG_INHERITANCE[
+            genes[:, self.mothers], genes[:, self.fathers], genes[:, self.children]
+        ].sum(axis=1)
+        return log_p
+
+    def batches(self, size=BATCH):
+        """
+        Yield (genes, traits) matrices of at most `size` rows covering
+        every assignment of gene counts, and of the traits that are not
+        known, exactly once.
+
+        Assignment k has gene counts given by the base 3 digits of
+        k // 2^u and unknown traits by the bits of k % 2^u, where u is
+        the number of unknown traits.
+        """
+        people = len(self.names)
+        unknown = np.flatnonzero(self.unknown)
+        trait_count = 1 << len(unknown)
+        powers = 3 ** np.arange(people, dtype=np.int64)
+        bits = 1 << np.arange(len(unknown), dtype=np.int64)
+        total = 3 ** people * trait_count
+        for start in range(0, total, size):
+            k = np.arange(start, min(start + size, total), dtype=np.int64)
+            genes = (k[:, np.newaxis] // trait_count // powers % 3).astype(np.int8)
+            traits = np.repeat(self.known[np.newaxis, :], len(k), axis=0)
+            traits[:, unknown] = (k[:, np.newaxis] % trait_count & bits) != 0
+            yield genes, traits
+
+    def marginals(self, size=BATCH):
+        """
+        Return the gene and trait distribution of every person, in the
+        same form and with the same values as main in heredity.py.
+
+        Each batch is weighted by its joint probabilities and counted
+        into (person, value) cells with a single weighted bincount.
+        """
+        people = len(self.names)
+        offsets = np.arange(people)
+        gene_totals = np.zeros(3 * people)
+        trait_totals = np.zeros(2 * people)
+        for genes, traits in self.batches(size):
+            weights = np.exp(self.log_joint_probability(genes, traits))
+            weights = np.repeat(weights, people)
+            gene_totals += np.bincount((3 * offsets + genes).ravel(), weights,
+                                       minlength=3 * people)
+            trait_totals += np.bincount((2 * offsets + traits).ravel(), weights,
+                                        minlength=2 * people)
+
+        gene_totals = gene_totals.reshape(people, 3)
+        gene_totals /= gene_totals.sum(axis=1, keepdims=True)
+        trait_totals = trait_totals.reshape(people, 2)
+        trait_totals /= trait_totals.sum(axis=1, keepdims=True)
+        return {
+            name: {
+                "gene": {g: float(gene_totals[i, g]) for g in GENES},
+                "trait": {True: float(trait_totals[i, 1]), False: float(trait_totals[i, 0])},
+            }
+            for i, name in enumerate(self.names)
+        }
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import csv
-import itertools
 import sys
 
 PROBS = {
@@ -59,31 +58,25 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    # Loop over every assignment of genes and traits that agrees with
+    # known information
+    for one_gene, two_genes, have_trait in assignments(people):
+        # Update probabilities with new joint probability
+        p = joint_probability(people, one_gene, two_genes, have_trait)
+        update(probabilities, one_gene, two_genes, have_trait, p)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
 
     # Print results
-    for person in people:
+    print_probabilities(probabilities)
+
+
+def print_probabilities(probabilities):
+    """
+    Print the gene and trait distribution of every person.
+    """
+    for person in probabilities:
         print(f"{person}:")
         for field in probabilities[person]:
             print(f"  {field.capitalize()}:")
@@ -114,16 +107,52 @@ def load_data(filename):
     return data
 
 
-def powerset(s):
+def subsets(mask):
+    """
+    Yield every subset of the bitmask `mask` as a bitmask, from `mask`
+    itself down to 0, without building any of them up front.
+    """
+    subset = mask
+    while True:
+        yield subset
+        if subset == 0:
+            return
+        subset = (subset - 1) & mask
+
+
+def members(names, mask):
+    """
+    Return the set of names[i] for every bit i set in `mask`.
+    """
+    return {name for i, name in enumerate(names) if mask >> i & 1}
+
+
+def assignments(people):
     """
-    Return a list of all possible subsets of set s.
+    Yield every (one_gene, two_genes, have_trait) triple of sets that
+    agrees with the known traits of `people`, lazily.
+
+    Subsets are enumerated as bitmasks over the list of names and only
+    turned into sets as they are yielded. People with a known trait are
+    fixed in `have_trait` up front, so only the people whose trait is
+    unknown are enumerated, and no trait assignment that contradicts
+    the evidence ever reaches the gene loops.
     """
-    s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    names = list(people)
+    everyone = (1 << len(names)) - 1
+    known = unknown = 0
+    for i, name in enumerate(names):
+        if people[name]["trait"] is None:
+            unknown |= 1 << i
+        elif people[name]["trait"]:
+            known |= 1 << i
+
+    for traits in subsets(unknown):
+        have_trait = members(names, known | traits)
+        for one in subsets(everyone):
+            one_gene = members(names, one)
+            for two in subsets(everyone & ~one):
+                yield one_gene, members(names, two), have_trait
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import sys
+
+from heredity import PROBS, load_data, print_probabilities, prob_gene_num
+
+# Gene counts, in the order main lists them
+GENES = (2, 1, 0)
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python inference.py data.csv")
+    people = load_data(sys.argv[1])
+    print_probabilities(marginals(people))
+
+
+class Factor():
+    """
+    A table of nonnegative values over the joint gene counts of the
+    people in `variables`, keyed by tuples of gene counts in the same
+    order.
+    """
+
+    def __init__(self, variables, table):
+        self.variables = tuple(variables)
+        self.table = table
+
+    def multiply(self, other):
+        """
+        Return the product of this factor and `other`, over the union of
+        their variables.
+        """
+        variables = self.variables + tuple(
+            v for v in other.variables if v not in self.variables
+        )
+        mine = [variables.index(v) for v in self.variables]
+        theirs = [variables.index(v) for v in other.variables]
+        table = dict()
+        for genes in itertools.product(GENES, repeat=len(variables)):
+            table[genes] = (
+                self.table[tuple(genes[i] for i in mine)] *
+                other.table[tuple(genes[i] for i in theirs)]
+            )
+        return Factor(variables, table)
+
+    def marginalize(self, variables):
+        """
+        Return this factor summed over every variable not in `variables`,
+        scaled to sum to 1 so that long chains of messages do not
+        underflow.
+        """
+        variables = tuple(variables)
+        positions = [self.variables.index(v) for v in variables]
+        table = dict.fromkeys(itertools.product(GENES, repeat=len(variables)), 0)
+        for genes, p in self.table.items():
+            table[tuple(genes[i] for i in positions)] += p
+        total = sum(table.values())
+        if total > 0:
+            for genes in table:
+                table[genes] /= total
+        return Factor(variables, table)
+
+
+def child_gene(mother_gene, father_gene, gene):
+    """
+    Return the probability that a child of parents with `mother_gene`
+    and `father_gene` copies of the gene has `gene` copies, accounting
+    for mutation as joint_probability does.
+    """
+    if gene == 0:
+        return prob_gene_num(father_gene, False) * prob_gene_num(mother_gene, False)
+    if gene == 1:
+        return (prob_gene_num(father_gene, True) * prob_gene_num(mother_gene, False) +
+                prob_gene_num(father_gene, False) * prob_gene_num(mother_gene, True))
+    return prob_gene_num(father_gene, True) * prob_gene_num(mother_gene, True)
+
+
+def pedigree_factors(people):
+    """
+    Return one Factor per person of `people` (as loaded by load_data):
+    the unconditional gene distribution for people without parents, or
+    the inheritance table over their own and their parents' genes, in
+    either case times the likelihood of their known trait, if any.
+
+    Unknown traits sum to 1 and drop out, so the only variables left
+    are the gene counts.
+    """
+    factors = []
+    for person, data in people.items():
+        trait = data["trait"]
+        likelihood = {
+            gene: 1 if trait is None else PROBS["trait"][gene][trait]
+            for gene in GENES
+        }
+        if data["mother"] is None:
+            factors.append(Factor((person,), {
+                (gene,): PROBS["gene"][gene] * likelihood[gene] for gene in GENES
+            }))
+        else:
+            mother, father = data["mother"], data["father"]
+            factors.append(Factor((person, mother, father), {
+                (gene, mother_gene, father_gene):
+                    child_gene(mother_gene, father_gene, gene) * likelihood[gene]
+                for gene, mother_gene, father_gene in itertools.product(GENES, repeat=3)
+            }))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Return the variables of `factors` in greedy min-degree elimination
+    order: repeatedly the variable sharing a factor with the fewest
+    others, connecting its neighbours once it is eliminated.
+
+    Degrees are kept in a heap and only recomputed for the neighbours of
+    each eliminated variable, so a pedigree with a bounded number of
+    mates and children per person is ordered in O(n log n).
+    """
+    neighbors = dict()
+    for factor in factors:
+        for v in factor.variables:
+            neighbors.setdefault(v, set()).update(factor.variables)
+            neighbors[v].discard(v)
+
+    counter = itertools.count()
+    heap = [(len(adjacent), next(counter), v) for v, adjacent in neighbors.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        degree, _, v = heapq.heappop(heap)
+        if v not in neighbors or degree != len(neighbors[v]):
+            # Eliminated already, or degree changed since it was pushed
+            continue
+        adjacent = neighbors.pop(v)
+        for u in adjacent:
+            neighbors[u].discard(v)
+            neighbors[u].update(adjacent - {u})
+            heapq.heappush(heap, (len(neighbors[u]), next(counter), u))
+        order.append(v)
+    return order
+
+
+def clique_tree(factors, order):
+    """
+    Return the clique tree that variable elimination in `order` builds
+    over `factors`, as a list of clusters in elimination order.
+
+    Each cluster is a dict with the eliminated "variable", the "scope"
+    of everything multiplied together to eliminate it, the product
+    "potential" of the original factors used there, the "children"
+    whose messages it consumed and the "parent" (index, or None for
+    the root of a connected component) that consumes its own message
+    over "sepset", its scope minus the eliminated variable.
+    """
+    # Unused items by variable: ("factor", i) or ("cluster", i)
+    pending = dict()
+    for i, factor in enumerate(factors):
+        for v in factor.variables:
+            pending.setdefault(v, set()).add(("factor", i))
+
+    clusters = []
+    for v in order:
+        items = pending.pop(v, set())
+        for item in items:
+            kind, i = item
+            scope = factors[i].variables if kind == "factor" else clusters[i]["sepset"]
+            for u in scope:
+                if u != v:
+                    pending[u].discard(item)
+
+        scope = {v}
+        children = []
+        for kind, i in sorted(items):
+            if kind == "factor":
+                scope.update(factors[i].variables)
+            else:
+                children.append(i)
+                clusters[i]["parent"] = len(clusters)
+                scope.update(clusters[i]["sepset"])
+
+        # Start from ones over the whole scope, so that messages sent
+        # down keep every variable of the sepset they are summed onto
+        variables = tuple(sorted(scope))
+        potential = Factor(variables, dict.fromkeys(
+            itertools.product(GENES, repeat=len(variables)), 1
+        ))
+        for kind, i in sorted(items):
+            if kind == "factor":
+                potential = potential.multiply(factors[i])
+
+        sepset = tuple(sorted(scope - {v}))
+        clusters.append({
+            "variable": v,
+            "scope": scope,
+            "potential": potential,
+            "children": children,
+            "parent": None,
+            "sepset": sepset,
+        })
+        for u in sepset:
+            pending[u].add(("cluster", len(clusters) - 1))
+    return clusters
+
+
+def calibrate(clusters):
+    """
+    Return the belief of each cluster of a clique tree, by passing
+    messages up from the leaves in elimination order and back down
+    from the roots (Shafer-Shenoy). Every message is computed once, so
+    the cost is linear in the number of clusters for bounded cluster
+    sizes.
+    """
+    up = [None] * len(clusters)
+    for i, cluster in enumerate(clusters):
+        belief = cluster["potential"]
+        for child in cluster["children"]:
+            belief = belief.multiply(up[child])
+        up[i] = belief.marginalize(cluster["sepset"])
+
+    down = [None] * len(clusters)
+    beliefs = [None] * len(clusters)
+    for i in reversed(range(len(clusters))):
+        cluster = clusters[i]
+        incoming = [down[i]] if down[i] is not None else []
+        for child in cluster["children"]:
+            message = cluster["potential"]
+            for factor in incoming:
+                message = message.multiply(factor)
+            for other in cluster["children"]:
+                if other != child:
+                    message = message.multiply(up[other])
+            down[child] = message.marginalize(clusters[child]["sepset"])
+
+        belief = cluster["potential"]
+        for factor in incoming + [up[child] for child in cluster["children"]]:
+            belief = belief.multiply(factor)
+        beliefs[i] = belief
+    return beliefs
+
+
+def marginals(people):
+    """
+    Return the gene and trait distribution of every person in `people`,
+    in the same form and with the same values as main in heredity.py,
+    by exact inference over the pedigree instead of enumerating every
+    assignment.
+    """
+    factors = pedigree_factors(people)
+    clusters = clique_tree(factors, elimination_order(factors))
+    beliefs = calibrate(clusters)
+
+    probabilities = dict()
+    for cluster, belief in zip(clusters, beliefs):
+        person = cluster["variable"]
+        gene = belief.marginalize((person,)).table
+        trait = people[person]["trait"]
+        if trait is None:
+            has_trait = sum(gene[(g,)] * PROBS["trait"][g][True] for g in GENES)
+        else:
+            has_trait = 1 if trait else 0
+        probabilities[person] = {
+            "gene": {g: gene[(g,)] for g in GENES},
+            "trait": {True: has_trait, False: 1 - has_trait},
+        }
+    return {person: probabilities[person] for person in people}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import engine
+import graphfile
+import pagerank
+from pagerank import DAMPING, SAMPLES
+
+# Rounds of walks Monte Carlo takes at least
+MONTE_CARLO_ROUNDS = 5
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time every PageRank estimator on synthetic corpora and "
+                    "check that they agree with power iteration."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="numbers of pages to generate (default 1000 10000 100000)")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS),
+                        choices=list(GENERATORS))
+    parser.add_argument("--degree", type=int, default=5,
+                        help="average number of links per page (default 5)")
+    parser.add_argument("--html", metavar="DIRECTORY",
+                        help="write each corpus as HTML files under DIRECTORY "
+                             "and time crawling it")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of processes to crawl with (default 1)")
+    parser.add_argument("--python-limit", type=int, default=1000,
+                        help="largest corpus to run the pure Python estimators "
+                             "on, which take O(pages^2) per iteration (default 1000)")
+    parser.add_argument("--samples-per-page", type=int, default=100,
+                        help="samples the sampling estimators take per page, "
+                             f"and at least {SAMPLES} (default 100)")
+    parser.add_argument("--tolerance", type=float, default=1e-6,
+                        help="largest L1 error allowed for exact methods")
+    parser.add_argument("--sample-tolerance", type=float, default=0.15,
+                        help="largest L1 error allowed for sampled estimates "
+                             "(default 0.15)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'generator':<15}{'pages':>10}{'estimator':>16}{'seconds':>12}"
+          f"{'iterations':>12}{'L1 error':>12}")
+    for name in args.generators:
+        for size in args.sizes:
+            rng = np.random.default_rng(args.seed)
+            corpus = GENERATORS[name](size, args.degree, rng)
+            timings = benchmark_corpus(corpus, args, f"{name}-{size}")
+            for timing in timings:
+                timing.update(generator=name, pages=size)
+                error = "" if timing["error"] is None else f"{timing['error']:.2e}"
+                iterations = "" if timing["iterations"] is None else timing["iterations"]
+                flag = "" if timing["agrees"] else "  DISAGREES"
+                print(f"{name:<15}{size:>10}{timing['estimator']:>16}"
+                      f"{timing['seconds']:>12.3f}{iterations:>12}{error:>12}{flag}")
+            results.extend(timings)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if not all(timing["agrees"] for timing in results):
+        sys.exit("Some estimators disagree with power iteration.")
+
+
+def benchmark_corpus(corpus, args, label):
+    """
+    Times every estimator on `corpus` and returns a list with, for each,
+    its name, wall time, iteration count (for iterative solvers), L1
+    distance from the reference ranks and whether that is within
+    tolerance. With `args.html` the corpus is first written to the
+    directory `label` under it and crawled.
+
+    Every estimator is timed from the corpus dict, including compiling
+    it into arrays or writing it to a graph file. The reference is power
+    iteration on the sparse engine run to a much tighter tolerance.
+
+    Errors are L1 distances between rank vectors, which do not shrink
+    with the number of pages the way per-page differences do: a uniform
+    vector is 0.25 or more away from the reference for every generator
+    at any size. Exact methods must agree to `args.tolerance` and
+    sampled ones to `args.sample_tolerance`. Sampling error grows like
+    the square root of pages per sample, so the samplers take
+    `args.samples_per_page` samples per page.
+    """
+    graph = engine.build_graph(corpus)
+    reference = engine.power_iteration(graph, DAMPING, tolerance=1e-12)
+    samples = max(SAMPLES, args.samples_per_page * len(corpus))
+    # Walks per round so that the first MONTE_CARLO_ROUNDS rounds take
+    # about `samples` visits, a walk making 1 / (1 - d) of them
+    walks = max(1, round(samples * (1 - DAMPING) / MONTE_CARLO_ROUNDS))
+    estimators = []
+
+    if args.html:
+        directory = os.path.join(args.html, label)
+        write_html(corpus, directory)
+        estimators.append(("crawl", False, lambda: check_crawl(
+            pagerank.crawl(directory, args.workers), corpus)))
+    if len(corpus) <= args.python_limit:
+        estimators.append(("python-sample", True, lambda: quietly(
+            pagerank.sample_pagerank, corpus, DAMPING, samples)))
+        estimators.append(("python-iterate", False, lambda: quietly(
+            pagerank.iterate_pagerank, corpus, DAMPING, 1e-10)))
+    estimators.append(("sample", True, lambda: engine.sample_pagerank(
+        corpus, DAMPING, samples, rng=args.seed)))
+    estimators.append(("monte-carlo", True, lambda: engine.to_dict(graph, engine.monte_carlo(
+        engine.build_graph(corpus), DAMPING, walks=walks,
+        min_rounds=MONTE_CARLO_ROUNDS, rng=args.seed)[0])))
+    # Filled in with the iteration count by the iterative solvers
+    stats = {}
+    for method in engine.METHODS:
+        estimators.append((method, False, lambda method=method: engine.iterate_pagerank(
+            corpus, DAMPING, method, stats=stats)))
+
+    timings = []
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "corpus.graph")
+        estimators.append(("out-of-core", False, lambda: out_of_core(corpus, path, stats)))
+
+        for name, sampled, estimate in estimators:
+            stats.clear()
+            start = time.perf_counter()
+            ranks = estimate()
+            seconds = time.perf_counter() - start
+            if ranks is None:
+                error, agrees = None, True
+            else:
+                ranks = np.array([ranks[page] for page in graph.pages])
+                error = float(np.abs(ranks - reference).sum())
+                agrees = error <= (args.sample_tolerance if sampled else args.tolerance)
+            timings.append({"estimator": name, "seconds": seconds,
+                            "iterations": stats.get("iterations"),
+                            "error": error, "agrees": agrees})
+    return timings
+
+
+def out_of_core(corpus, path, stats=None):
+    """
+    Writes `corpus` to a link graph file at `path` and ranks it out of
+    core, returning a page -> rank dict.
+    """
+    graphfile.write_graph(path, corpus)
+    graph = graphfile.MappedGraph(path)
+    ranks = graphfile.iterate_pagerank(graph, DAMPING, stats=stats)
+    return graphfile.to_dict(graph, ranks)
+
+
+def check_crawl(crawled, corpus):
+    """
+    Exits unless `crawl` read back exactly the generated corpus.
+    """
+    if crawled != corpus:
+        sys.exit("crawl did not read back the generated corpus")
+
+
+def quietly(function, *args):
+    """
+    Calls `function` with its progress printing, on stdout or stderr,
+    silenced.
+    """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return function(*args)
+
+
+def erdos_renyi(n, degree, rng):
+    """
+    Returns a corpus of `n` pages with `degree` * `n` links between
+    uniformly random pairs of pages (self-links and duplicates dropped).
+    """
+    sources = rng.integers(n, size=degree * n)
+    targets = rng.integers(n, size=degree * n)
+    return _corpus(n, sources, targets)
+
+
+def preferential_attachment(n, degree, rng):
+    """
+    Returns a corpus of `n` pages where each page links to `degree`
+    earlier pages, chosen with probability proportional to one plus the
+    number of links they already receive, so that in-degrees follow a
+    power law.
+    """
+    # Every page appears once, plus once per link it receives
+    pool = []
+    draws = rng.random(degree * n).tolist()
+    sources = []
+    targets = []
+    for page in range(n):
+        if pool:
+            for draw in draws[degree * page:degree * (page + 1)]:
+                target = pool[int(draw * len(pool))]
+                sources.append(page)
+                targets.append(target)
+                pool.append(target)
+        pool.append(page)
+    return _corpus(n, sources, targets)
+
+
+def dangling(n, degree, rng, fraction=0.5):
+    """
+    Returns an Erdős–Rényi corpus in which `fraction` of the pages have
+    had all their links removed.
+    """
+    corpus = erdos_renyi(n, degree, rng)
+    for page, empty in zip(corpus, rng.random(n) < fraction):
+        if empty:
+            corpus[page] = set()
+    return corpus
+
+
+GENERATORS = {
+    "erdos-renyi": erdos_renyi,
+    "preferential": preferential_attachment,
+    "dangling": dangling,
+}
+
+
+def _corpus(n, sources, targets):
+    """
+    Returns a crawl corpus of pages "0.html" ... over the links given by
+    the page numbers in `sources` and `targets`.
+    """
+    pages = [f"{i}.html" for i in range(n)]
+    corpus = {page: set() for page in pages}
+    for source, target in zip(np.asarray(sources).tolist(), np.asarray(targets).tolist()):
+        if source != target:
+            corpus[pages[source]].add(pages[target])
+    return corpus
+
+
+def write_html(corpus, directory):
+    """
+    Writes `corpus` as one HTML file per page in `directory`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for page, links in corpus.items():
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<head>\n<title>{page}</title>\n</head>\n<body>\n")
+            for link in sorted(links):
+                f.write(f"<a href=\"{link}\">{link}</a>\n")
+            f.write("</body>\n</html>\n")
+
+
+if __name__ == "__main__":
+    main()
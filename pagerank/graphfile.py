@@ -0,0 +1,258 @@
+import argparse
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+from pagerank import CRAWL_CHUNK, DAMPING, MAX_ITERATIONS, parse_pages
+
+MAGIC = b"PRGRAPH1"
+
+# magic, pages, links, bytes per link index, bytes of page names
+HEADER = struct.Struct("=8sqqqq")
+
+# Links streamed per block by iterate_pagerank
+BLOCK_LINKS = 1 << 22
+
+
+class MappedGraph():
+    """
+    A link graph file opened with numpy.memmap.
+
+    The file holds, after a fixed header and each padded to 8 bytes:
+        indptr        int64[pages + 1]  out-links of page i are
+        indices       int32 or int64    indices[indptr[i]:indptr[i + 1]]
+        name_offsets  int64[pages + 1]  page i is named
+        names         UTF-8             names[name_offsets[i]:name_offsets[i + 1]]
+    Nothing but the header is read until it is used.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, pages, links, itemsize, names_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a link graph file")
+        self.path = path
+        self.n = pages
+        self.links = links
+
+        offset = HEADER.size
+        self.indptr = np.memmap(path, np.int64, "r", offset, pages + 1)
+        offset += _padded(8 * (pages + 1))
+        dtype = np.int32 if itemsize == 4 else np.int64
+        self.indices = np.memmap(path, dtype, "r", offset, links) if links else np.empty(0, dtype)
+        offset += _padded(itemsize * links)
+        self.name_offsets = np.memmap(path, np.int64, "r", offset, pages + 1)
+        offset += _padded(8 * (pages + 1))
+        self.names = np.memmap(path, np.uint8, "r", offset, names_size) if names_size else b""
+
+    def __len__(self):
+        return self.n
+
+    def page(self, i):
+        """
+        Returns the name of page `i`.
+        """
+        start, end = self.name_offsets[i], self.name_offsets[i + 1]
+        return bytes(self.names[start:end]).decode("utf-8")
+
+    def pages(self):
+        """
+        Returns the names of every page in index order.
+        """
+        names = bytes(self.names)
+        offsets = self.name_offsets.tolist()
+        return [
+            names[start:end].decode("utf-8")
+            for start, end in zip(offsets, offsets[1:])
+        ]
+
+
+def write_graph(path, corpus):
+    """
+    Writes a crawl corpus (page -> set of linked pages) to a link graph
+    file at `path`. Pages are stored in sorted order.
+    """
+    pages = sorted(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    _write(path, pages, (
+        [index[link] for link in corpus[page]] for page in pages
+    ))
+
+
+def write_corpus(directory, path):
+    """
+    Crawl `directory` straight into a link graph file at `path`, the
+    way pagerank.crawl would, but holding only the page names and the
+    links of one chunk of CRAWL_CHUNK files in memory at a time.
+    """
+    pages = sorted(
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    )
+    index = {page: i for i, page in enumerate(pages)}
+
+    def links():
+        for start in range(0, len(pages), CRAWL_CHUNK):
+            chunk = pages[start:start + CRAWL_CHUNK]
+            parsed = parse_pages(directory, chunk)
+            for page in chunk:
+                # Only include links to other pages in the corpus
+                yield [index[link] for link in parsed[page] if link in index]
+
+    _write(path, pages, links())
+
+
+def _write(path, pages, links):
+    """
+    Writes a link graph file for `pages` with the out-link indices of
+    each page given, in order, by the iterable `links`.
+
+    The indices are spooled to a temporary file while counting degrees,
+    since indptr has to be written before them.
+    """
+    n = len(pages)
+    dtype = np.int32 if n < 2 ** 31 else np.int64
+    itemsize = np.dtype(dtype).itemsize
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    directory = os.path.dirname(os.path.abspath(path))
+
+    with tempfile.TemporaryFile(dir=directory) as spool:
+        for i, targets in enumerate(links):
+            spool.write(np.asarray(targets, dtype=dtype).tobytes())
+            indptr[i + 1] = len(targets)
+        np.cumsum(indptr, out=indptr)
+        links = int(indptr[-1])
+        spool.seek(0)
+
+        encoded = [page.encode("utf-8") for page in pages]
+        name_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+        names = b"".join(encoded)
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, n, links, itemsize, len(names)))
+            _write_padded(f, indptr.tobytes())
+            shutil.copyfileobj(spool, f)
+            f.write(bytes(_padded(itemsize * links) - itemsize * links))
+            _write_padded(f, name_offsets.tobytes())
+            f.write(names)
+        os.replace(temporary, path)
+
+
+def iterate_pagerank(graph, damping_factor=DAMPING, tolerance=1e-10,
+                     max_iterations=MAX_ITERATIONS, block_links=BLOCK_LINKS, stats=None):
+    """
+    Returns the PageRank vector of the MappedGraph `graph` by power
+    iteration, like engine.power_iteration, streaming the links from
+    disk in blocks of whole pages holding about `block_links` links.
+
+    Only a few vectors of one value per page and one block of links are
+    held in memory at a time, so graphs with more links than fit in RAM
+    can be ranked. Stops once the L1 change between steps is below
+    `tolerance`, or after `max_iterations` steps; if `stats` is a dict,
+    the number of steps is stored under "iterations".
+    """
+    n = len(graph)
+    out_degree = np.diff(graph.indptr)
+    dangling = out_degree == 0
+    blocks = _blocks(graph.indptr, block_links)
+
+    ranks = np.full(n, 1 / n)
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        share = np.divide(ranks, out_degree, out=np.zeros(n), where=~dangling)
+        new_ranks = np.zeros(n)
+        for start, end in blocks:
+            targets = graph.indices[graph.indptr[start]:graph.indptr[end]]
+            weights = np.repeat(share[start:end], out_degree[start:end])
+            received = np.bincount(targets, weights)
+            new_ranks[:len(received)] += received
+        new_ranks = (1 - damping_factor) / n + damping_factor * (
+            new_ranks + ranks[dangling].sum() / n
+        )
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if residual < tolerance:
+            break
+
+    if stats is not None:
+        stats["iterations"] = iterations
+    return ranks / ranks.sum()
+
+
+def _blocks(indptr, block_links):
+    """
+    Returns (start, end) page ranges that split the links of `indptr`
+    into blocks of at most `block_links` links, except for single pages
+    with more links than that.
+    """
+    n = len(indptr) - 1
+    blocks = []
+    start = 0
+    while start < n:
+        end = int(np.searchsorted(indptr, indptr[start] + block_links, "right")) - 1
+        end = min(max(end, start + 1), n)
+        blocks.append((start, end))
+        start = end
+    return blocks
+
+
+def to_dict(graph, ranks):
+    """
+    Returns the rank vector `ranks` of `graph` as a page -> rank dict.
+    """
+    return dict(zip(graph.pages(), ranks.tolist()))
+
+
+def _padded(size):
+    """
+    Return `size` rounded up to a multiple of 8.
+    """
+    return -(-size // 8) * 8
+
+
+def _write_padded(f, data):
+    """
+    Write `data` to `f` followed by zero bytes up to a multiple of 8.
+    """
+    f.write(data)
+    f.write(bytes(_padded(len(data)) - len(data)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a corpus to a memory-mapped link graph file, "
+                    "or rank one out of core."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    write = subparsers.add_parser("write", help="crawl a corpus into a graph file")
+    write.add_argument("corpus")
+    write.add_argument("graph")
+    rank = subparsers.add_parser("rank", help="rank the pages of a graph file")
+    rank.add_argument("graph")
+    rank.add_argument("--tolerance", type=float, default=1e-10)
+    rank.add_argument("--block-links", type=int, default=BLOCK_LINKS,
+                      help=f"links read per block (default {BLOCK_LINKS})")
+    args = parser.parse_args()
+
+    if args.command == "write":
+        write_corpus(args.corpus, args.graph)
+        graph = MappedGraph(args.graph)
+        print(f"Wrote {len(graph)} pages and {graph.links} links to {args.graph}")
+        return
+
+    graph = MappedGraph(args.graph)
+    stats = {}
+    ranks = iterate_pagerank(graph, DAMPING, args.tolerance,
+                             block_links=args.block_links, stats=stats)
+    print(f"PageRank Results from Out-of-Core Iteration ({stats['iterations']} iterations)")
+    for page, rank in sorted(to_dict(graph, ranks).items()):
+        print(f"  {page}: {rank:.4f}")
+
+
+if __name__ == "__main__":
+    main()
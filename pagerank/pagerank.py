@@ -1,42 +1,175 @@
+import argparse
+import csv
+import heapq
+import json
+import multiprocessing
 import os
 import random
 import re
 import sys
+import time
 
 DAMPING = 0.85
 SAMPLES = 10000
+MAX_ITERATIONS = 1000
+
+# Files each crawl worker parses per task
+CRAWL_CHUNK = 256
+
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
-    print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
+    parser = argparse.ArgumentParser(description="Rank the pages of a corpus.")
+    parser.add_argument("corpus")
+    parser.add_argument("--sparse", action="store_true",
+                        help="use the NumPy/SciPy engine")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of processes to crawl with (default 1)")
+    parser.add_argument("--method", default="power",
+                        choices=["power", "gauss-seidel", "quadratic"],
+                        help="iterative solver; all but power imply --sparse")
+    parser.add_argument("--tolerance", type=float,
+                        help="stop iterating once the L1 change is below this "
+                             "(default: every page changes by at most 0.001, "
+                             "or 1e-10 with --sparse)")
+    parser.add_argument("--max-iterations", type=int, default=MAX_ITERATIONS)
+    parser.add_argument("--residuals", action="store_true",
+                        help="print the L1 change of every iteration and the "
+                             "iteration count and wall time, and with "
+                             "--monte-carlo the largest error of every round")
+    parser.add_argument("--monte-carlo", type=int, metavar="K",
+                        help="sample with short walks until the top K pages are "
+                             "stable and print error bars; implies --sparse")
+    parser.add_argument("--top", type=int, metavar="K",
+                        help="only output the K highest ranked pages, best first")
+    parser.add_argument("--format", default="text", choices=["text", "csv", "json"],
+                        help="output text (default), CSV rows or JSON lines")
+    args = parser.parse_args()
+    sparse = args.sparse or args.method != "power" or args.monte_carlo is not None
+    corpus = crawl(args.corpus, args.workers)
+    pages = None
+    if sparse:
+        # NumPy/SciPy engine, only needed for large corpora; it returns
+        # rank vectors over the sorted page names in `pages`
+        import engine
+        graph = engine.build_graph(corpus)
+        pages = graph.pages
+    if args.format == "csv":
+        csv.writer(sys.stdout).writerow(["method", "page", "rank", "error"])
+
+    if args.monte_carlo is not None:
+        stats = {}
+        ranks, errors = engine.monte_carlo(graph, DAMPING, args.monte_carlo, stats=stats)
+        if args.residuals:
+            out = sys.stdout if args.format == "text" else sys.stderr
+            for i, width in enumerate(stats["widths"], 1):
+                print(f"Round {i}: largest error ±{width:.3e}", file=out)
+        write_ranks("monte-carlo", f"PageRank Results from Monte Carlo "
+                    f"(n = {stats['samples']}, {stats['walks']} walks)",
+                    ranks, args, pages, errors)
+    else:
+        if sparse:
+            ranks = engine.random_surfers(graph, DAMPING, SAMPLES) / SAMPLES
+        else:
+            ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+        write_ranks("sampling", f"PageRank Results from Sampling (n = {SAMPLES})",
+                    ranks, args, pages)
+    residuals = []
+    start = time.perf_counter()
+    if sparse:
+        stats = {}
+        ranks = engine.solve(
+            graph, DAMPING, args.method,
+            1e-10 if args.tolerance is None else args.tolerance,
+            args.max_iterations, stats=stats
+        )
+        residuals = stats["residuals"]
+    else:
+        ranks = iterate_pagerank(corpus, DAMPING, args.tolerance,
+                                 args.max_iterations, residuals)
+    seconds = time.perf_counter() - start
+    if args.residuals:
+        # Keep CSV and JSON output parseable
+        out = sys.stdout if args.format == "text" else sys.stderr
+        for i, residual in enumerate(residuals, 1):
+            print(f"Iteration {i}: L1 change {residual:.3e}", file=out)
+        print(f"{len(residuals)} iterations in {seconds:.3f} seconds", file=out)
+    write_ranks("iteration", f"PageRank Results from Iteration", ranks, args, pages)
+
+
+def write_ranks(method, title, ranks, args, pages=None, errors=None):
+    """
+    Print the PageRank values `ranks` found by `method` in the format
+    `args.format`: lines of "  page: rank" under `title`, CSV rows or
+    JSON lines. Every page is printed in name order or, with `args.top`,
+    only the top pages, best first.
 
+    `ranks` and `errors` are page -> value dicts, or vectors over the
+    sorted page names in `pages`. Vectors are never turned into dicts
+    or sorted in full: the top pages are picked with argpartition, and
+    rows are written one at a time.
+    """
+    if pages is None:
+        if args.top is None:
+            order = sorted(ranks)
+        else:
+            # Ties in name order, as engine.top_pages does
+            order = heapq.nsmallest(args.top, ranks, key=lambda page: (-ranks[page], page))
+        name = str
+    else:
+        import engine
+        if args.top is None:
+            order = range(len(pages))
+        else:
+            order = engine.top_pages(ranks, args.top)
+        name = pages.__getitem__
+
+    if args.format == "text":
+        print(title)
+    writer = csv.writer(sys.stdout)
+    for key in order:
+        page, rank = name(key), float(ranks[key])
+        error = None if errors is None else float(errors[key])
+        if args.format == "csv":
+            writer.writerow([method, page, rank, "" if error is None else error])
+        elif args.format == "json":
+            row = {"method": method, "page": page, "rank": rank}
+            if error is not None:
+                row["error"] = error
+            print(json.dumps(row))
+        elif error is None:
+            print(f"  {page}: {rank:.4f}")
+        else:
+            print(f"  {page}: {rank:.4f} ± {error:.4f}")
 
-def crawl(directory):
+
+def crawl(directory, workers=1):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    With more than one worker, the files are parsed in chunks of
+    CRAWL_CHUNK by a process pool and the results merged.
     """
-    pages = dict()
+    filenames = [
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    ]
 
     # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    if workers <= 1:
+        pages = parse_pages(directory, filenames)
+    else:
+        chunks = [
+            (directory, filenames[i:i + CRAWL_CHUNK])
+            for i in range(0, len(filenames), CRAWL_CHUNK)
+        ]
+        pages = dict()
+        with multiprocessing.Pool(workers) as pool:
+            for chunk in pool.imap_unordered(_parse_chunk, chunks):
+                pages.update(chunk)
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -48,6 +181,60 @@ def crawl(directory):
     return pages
 
 
+def parse_pages(directory, filenames):
+    """
+    Return a dictionary mapping each of `filenames` in `directory` to
+    the set of other pages it links to.
+    """
+    pages = dict()
+    for filename in filenames:
+        with open(os.path.join(directory, filename)) as f:
+            links = LINK_PATTERN.findall(f.read())
+        pages[filename] = set(links) - {filename}
+    return pages
+
+
+def _parse_chunk(chunk):
+    """
+    Pool task wrapper around `parse_pages` for a (directory, filenames)
+    chunk.
+    """
+    return parse_pages(*chunk)
+
+
+class Transitions():
+    """
+    The transition model of a corpus for one damping factor, computed
+    once per sampling run so that it does not have to be rebuilt on
+    every step.
+
+    A page with links moves to each page of the corpus with probability
+    `teleport` and to each of its `links` with an extra `follow[page]`;
+    a page without links moves to every page with probability 1 / N.
+    Both parts are uniform, so sampling draws whether to follow a link
+    and then an index into a list, in constant time.
+    """
+
+    def __init__(self, corpus, damping_factor):
+        self.damping_factor = damping_factor
+        self.pages = list(corpus)
+        self.teleport = (1 - damping_factor) / len(corpus)
+        self.links = {page: list(links) for page, links in corpus.items()}
+        self.follow = {
+            page: damping_factor / len(links) if links else 0
+            for page, links in corpus.items()
+        }
+
+    def sample(self, page):
+        """
+        Return a page drawn from the distribution of the page after `page`.
+        """
+        links = self.links[page]
+        if links and random.random() < self.damping_factor:
+            return random.choice(links)
+        return random.choice(self.pages)
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -97,32 +284,25 @@ def sample_pagerank(corpus, damping_factor, n):
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    model = Transitions(corpus, damping_factor)
     page_rank = dict.fromkeys(corpus, 0)
     # the first time: randomly choose the page
-    next_page = random.choice(list(corpus.keys()))
+    next_page = random.choice(model.pages)
     page_rank[next_page] += 1
     for i in range(n - 1):
         # choose the next page
-        x = random.uniform(0, 1)
-        prob_dis = transition_model(corpus, next_page, damping_factor)
-        # cumulative probability
-        cumu_prob = 0
-        # choose the next page according to the cumulate probability
-        for page, p in prob_dis.items():
-            cumu_prob += p
-            if cumu_prob > x:
-                next_page = page
-                break
+        next_page = model.sample(next_page)
         page_rank[next_page] += 1
         # the value of page_rank is the number of visited times,
         # and we need to turn it to probability
     for page in page_rank.keys():
         page_rank[page] /= n
-    print(f"sample check sample: {sum(page_rank.values())}")
+    print(f"sample check sample: {sum(page_rank.values())}", file=sys.stderr)
     return page_rank
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=None,
+                     max_iterations=MAX_ITERATIONS, residuals=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -130,27 +310,44 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Without a `tolerance`, convergence means no page changed by more
+    than 0.001 in the last iteration; with one, it means the L1 norm of
+    the change is below it. Iteration stops after `max_iterations`
+    either way. If `residuals` is a list, the L1 change of every
+    iteration is appended to it.
     """
     n = len(corpus)
     page_rank = dict.fromkeys(corpus, (1 - damping_factor) / n)
     # return a dict that contains the number of links of each page
     num_links = {page: len(corpus[page]) for page in corpus.keys()}
+    # a page with no links is interpreted as having one link to every page
+    dangling = [page for page in corpus.keys() if num_links[page] == 0]
     flag = True
-    while flag:
+    iterations = 0
+    while flag and iterations < max_iterations:
         flag = False
+        iterations += 1
         new_rank = {}
+        dangling_rank = sum(page_rank[i] for i in dangling) / n
         for page in corpus.keys():
             x = sum((page_rank[i] / num_links[i]) for i in corpus.keys() if page in corpus[i])
+            x += dangling_rank
             new_rank[page] = (1 - damping_factor) / n + damping_factor * x
-            if abs(new_rank[page] - page_rank[page]) > 0.001:
+            if tolerance is None and abs(new_rank[page] - page_rank[page]) > 0.001:
                 # still not convergence so continue to loop
                 flag = True
+        change = sum(abs(new_rank[p] - page_rank[p]) for p in new_rank)
+        if tolerance is not None and change >= tolerance:
+            flag = True
+        if residuals is not None:
+            residuals.append(change)
         for p in new_rank:
             page_rank[p] = new_rank[p]
     total_rank = sum(page_rank.values())
     for p in page_rank:
         page_rank[p] /= total_rank
-    print(f"sample check iteration: {sum(page_rank.values())}")
+    print(f"sample check iteration: {sum(page_rank.values())}", file=sys.stderr)
     return page_rank
 
 